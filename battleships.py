@@ -1,8 +1,25 @@
 import random
 import numpy as np
 
+try:  # numba is optional, the compiled functions run as plain Python when it is not installed.
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def compiled(function):
+    """ Compiles a function to machine code with numba, if numba is installed. """
+    return njit(cache=True)(function) if njit else function
+
 
 class Ship:
+    _VARIETIES = {2: 'Destroyer', 3: 'Submarine', 4: 'Battleship', 5: 'Aircraft Carrier'}
+
+    _DIRECTION_VECTORS = {'N': (-1, 0),
+                          'S': (1, 0),
+                          'E': (0, 1),
+                          'W': (0, -1)}
+
     def __init__(self, length, start, direction):
         """
         Args:
@@ -10,26 +27,25 @@ class Ship:
             - start: Coordinate of the rearmost ship section as a 2-element tuple.
             - direction: Orientation of the ship, given as 'N', 'E', 'S', or 'W'.
         """
-        ship_varieties = {2: 'Destroyer', 3: 'Submarine', 4: 'Battleship', 5: 'Aircraft Carrier'}
-
         self._length = length
-        self.variety = ship_varieties[length]
+        self.variety = self._VARIETIES[length]
         self.condition = length
 
-        direction_vectors = {'N': (-1, 0),
-                             'S': (1, 0),
-                             'E': (0, 1),
-                             'W': (0, -1)}
-        direction_vector = direction_vectors[direction]
+        direction_vector = self._DIRECTION_VECTORS[direction]
 
         self._points = [(start[0] + i*direction_vector[0], start[1] + i*direction_vector[1])
                         for i in range(length)]
+        self._points_set = frozenset(self._points)
 
+        self.start = self._points[0]
         self.endpoint = self._points[-1]
 
     def __iter__(self):
         return iter(self._points)
 
+    def __contains__(self, coordinate):
+        return coordinate in self._points_set
+
     def __len__(self):
         return self._length
 
@@ -41,37 +57,54 @@ class Ship:
 
 
 class Board:
+    # Symbols for each board square value, indexed by the value:
+    # sea, un-hit ship section, hit ship section, previous miss.
+    _SYMBOLS = '_#XO'
+    _HIDDEN_SYMBOLS = '~~XO'
+
     def __init__(self, n):
         # The board attribute contains an n x n numpy array representing the game board
         # Each square of the board has a different value:
         # 0 = sea,  1 = un-hit ship section, 2 = hit ship section, 3 = previous miss
         self._n = n
-        self._board = np.zeros((self._n, self._n), dtype=np.int)
+        self._board = np.zeros((self._n, self._n), dtype=np.uint8)
 
         # The ships attribute contains a list of Ship objects.
         self.ships = list()
+        # Length of the smallest remaining ship, updated whenever a ship is placed or sunk.
+        self._smallest_ship_len = 0
 
         # The previous_hits variable stores all coordinates where the AI hit a player's ship, this is so that further
         # shots can target a similar area.
         # When a ship is sunk, it's coordinates are removed from the list, this is so that the AI does not continue to
         # fire near ships that are already sunk.
         self._previous_hits = list()
+        self._previous_hits_set = set()  # The same coordinates, for fast membership tests.
+
+        # Bit masks of the previous misses along each row and column: bit j of self._blocked_rows[i] and bit i of
+        # self._blocked_cols[j] are set when square (i, j) is a previous miss.
+        self._blocked_rows = [0] * self._n
+        self._blocked_cols = [0] * self._n
+
+        # Reused by the compiled generate_targets fallback to collect the coordinates of every square that could contain
+        # a ship; the plain Python fallback builds its list directly.
+        self._target_buffer = np.empty((self._n * self._n, 2), dtype=np.int16) if njit else None
+
+        # Maps the coordinate of each un-hit ship section to the Ship object it belongs to.
+        self._coord_to_ship = dict()
 
     def to_string(self, symbols=None):
         """ Returns a string representation of the board.
         Args:
-            - symbols: A dictionary mapping board square values to symbols. """
+            - symbols: A string or dictionary mapping board square values to symbols. """
 
         if not symbols:
-            symbols = {0: '_',  # Sea
-                       1: '#',  # Un-hit ship section
-                       2: 'X',  # Hit ship section
-                       3: 'O'}  # Previous miss
+            symbols = self._SYMBOLS
 
         result = []
         result.append('  ' + '_ '*self._n)
         for row_name, row in zip(ROWS, self._board):
-            result.append(row_name + '|' + '|'.join([symbols[x] for x in row]) + '|')
+            result.append(row_name + '|' + '|'.join([symbols[x] for x in row.tolist()]) + '|')
         result.append('  ' + ' '.join(COLS))
         return '\n'.join(result) + '\n'
 
@@ -81,12 +114,7 @@ class Board:
 
     def with_hidden_ships(self):
         """ Returns a string representation of the board with the location of the ships obscured."""
-        symbols = {0: '~',  # Sea
-                   1: '~',  # Un-hit ship section
-                   2: 'X',  # Hit ship section
-                   3: 'O'}  # Previous miss
-
-        return self.to_string(symbols=symbols)
+        return self.to_string(symbols=self._HIDDEN_SYMBOLS)
 
     def is_valid_placement(self, ship):
         """ Checks the attributes of a Ship object to see if it can fit on the board.
@@ -96,7 +124,9 @@ class Board:
         Returns:
             bool: Returns True if the Ship object can fit on the board.
         """
-        return (all(i in range(self._n) for i in ship.endpoint)  # Check to see that the ship does not end out of bounds
+        start, end = ship.start, ship.endpoint
+        return (0 <= start[0] < self._n and 0 <= start[1] < self._n  # Check to see that the ship is not out of bounds
+                and 0 <= end[0] < self._n and 0 <= end[1] < self._n
                 and all(self._board[point] != 1 for point in ship))  # Check for intersection with other ships
 
     def place_ship(self, ship):
@@ -105,9 +135,11 @@ class Board:
            - ship: A Ship object.
         """
         self.ships.append(ship)
+        self._smallest_ship_len = min(len(ship) for ship in self.ships)
 
         for point in ship:
             self._board[point] = 1
+            self._coord_to_ship[point] = ship
 
     def initialise_ships_with_inputs(self, ship_lengths):
         """ Places a player's ships on the board by using user inputs.
@@ -142,8 +174,8 @@ class Board:
         """
         for ship_length in ship_lengths:
             while True:
-                start_coordinate = tuple(random.randint(0, self._n - 1) for _ in range(2))
-                direction = random.choice(['N', 'E', 'S', 'W'])
+                start_coordinate = (random.randrange(self._n), random.randrange(self._n))
+                direction = random.choice('NESW')
 
                 ship = Ship(ship_length, start_coordinate, direction)
 
@@ -168,7 +200,12 @@ class Board:
             - list: List of 2-element tuples
         """
         row, col = coordinate
-        return [(row + dy, col) for dy in [1, -1] if row + dy in range(self._n)]
+        neighbours = []
+        if row + 1 < self._n:
+            neighbours.append((row + 1, col))
+        if row > 0:
+            neighbours.append((row - 1, col))
+        return neighbours
 
     def horizontal_neighbours(self, coordinate):
         """ Returns the directly horizontal neighbours of a coordinate, if they are on the board.
@@ -178,7 +215,12 @@ class Board:
             - list: List of 2-element tuples
         """
         row, col = coordinate
-        return [(row, col + dx) for dx in [1, -1] if col + dx in range(self._n)]
+        neighbours = []
+        if col + 1 < self._n:
+            neighbours.append((row, col + 1))
+        if col > 0:
+            neighbours.append((row, col - 1))
+        return neighbours
 
     def all_neighbours(self, coordinate):
         """ Returns the direct neighbours of a coordinate, if they are on the board.
@@ -196,34 +238,18 @@ class Board:
          Returns:
              - bool: True if the coordinate could contain a ship.
          """
-        # Find the maximum possible length of ship that could be at the coordinate:
         row, col = coordinate
-        dx, dy = (1, 1)
-        max_x_len, max_y_len = (1, 1)
-
-        while col+dx in range(self._n) and self._board[(row, col+dx)] < 3:
-            dx += 1
-            max_x_len += 1
-        dx = 1
-        while col-dx in range(self._n) and self._board[(row, col-dx)] < 3:
-            dx += 1
-            max_x_len += 1
-
-        while row+dy in range(self._n) and self._board[(row+dy, col)] < 3:
-            dy += 1
-            max_y_len += 1
-        dy = 1
-        while row-dy in range(self._n) and self._board[(row-dy, col)] < 3:
-            dy += 1
-            max_y_len += 1
+        if self._board[coordinate] >= 2:  # The coordinate has already been fired on
+            return False
 
-        max_possible_len = max(max_x_len, max_y_len)
+        # Find the maximum possible length of ship that could be at the coordinate, from the runs of squares not known
+        # to be misses through it:
+        max_x_len = free_line_length(self._blocked_rows[row], col, self._n)
+        max_y_len = free_line_length(self._blocked_cols[col], row, self._n)
 
-        # Find the smallest remaining ship:
-        smallest_ship = min(self.ships, key=lambda s: len(s))
+        max_possible_len = max(max_x_len, max_y_len)
 
-        return (self._board[coordinate] < 2  # Check that the coordinate has not already been fired on
-                and len(smallest_ship) <= max_possible_len)  # Check that one of the remaining ships could fit here
+        return self._smallest_ship_len <= max_possible_len  # Check that one of the remaining ships could fit here
 
     def apply_shot(self, coordinate):
         """ Handles a shot being made at the board, prints feedback.
@@ -235,20 +261,24 @@ class Board:
             print('Hit!')
             self._board[coordinate] = 2
             self._previous_hits.append(coordinate)
+            self._previous_hits_set.add(coordinate)
 
-            for ship in self.ships:
-                if target_coordinate in ship:
-                    ship.damage()
-                    if ship.sunk():
-                        print('{} sunk!'.format(ship.variety))
-                        self.ships.remove(ship)
-                        for point in ship:
-                            self._previous_hits.remove(point)
+            ship = self._coord_to_ship.pop(coordinate)
+            ship.damage()
+            if ship.sunk():
+                print('{} sunk!'.format(ship.variety))
+                self.ships.remove(ship)
+                self._smallest_ship_len = min((len(remaining) for remaining in self.ships), default=0)
+                self._previous_hits_set.difference_update(ship)
+                self._previous_hits = [point for point in self._previous_hits if point in self._previous_hits_set]
 
         else:  # self.board[coordinate] != 1:
             print('Miss.')
             if self._board[coordinate] == 0:
                 self._board[coordinate] = 3
+                row, col = coordinate
+                self._blocked_rows[row] |= 1 << col
+                self._blocked_cols[col] |= 1 << row
 
     def generate_targets(self):
         """ This is the key to the AI of the computer player, the function returns a list of the coordinates on the
@@ -260,31 +290,35 @@ class Board:
 
         # Of primary interest are adjacent previous hits, normally indicating a ship.
         # Consider target coordinates that lie on the line formed by the adjacent hits.
-        if adjacent_coordinates_in(self._previous_hits):
-            for coord_pair in adjacent_coordinates_in(self._previous_hits):
-                coord1, coord2 = coord_pair
-                if coord1[0] - coord2[0]:  # The coordinates are vertically adjacent.
-                    possible_targets += (self.vertical_neighbours(coord1) +
-                                         self.vertical_neighbours(coord2))
-                else:  # The coordinates are horizontally adjacent.
-                    possible_targets += (self.horizontal_neighbours(coord1) +
-                                         self.horizontal_neighbours(coord2))
-                # Coordinates that cannot contain ships are removed:
-                possible_targets = [coord for coord in possible_targets if self.can_contain_ship(coord)]
+        for coord1, coord2 in adjacent_coordinates_in(self._previous_hits, self._previous_hits_set):
+            if coord1[0] - coord2[0]:  # The coordinates are vertically adjacent.
+                possible_targets.extend(self.vertical_neighbours(coord1))
+                possible_targets.extend(self.vertical_neighbours(coord2))
+            else:  # The coordinates are horizontally adjacent.
+                possible_targets.extend(self.horizontal_neighbours(coord1))
+                possible_targets.extend(self.horizontal_neighbours(coord2))
+        # Coordinates that cannot contain ships are removed:
+        possible_targets = [coord for coord in possible_targets if self.can_contain_ship(coord)]
 
         if possible_targets:
             return possible_targets
 
         # If no target coordinates have been identified yet, target all neighbours of the previous hits:
         for previous_hit in self._previous_hits:
-            possible_targets += self.all_neighbours(previous_hit)
-            # Coordinates that cannot contain ships are removed.
-            possible_targets = [coord for coord in possible_targets if self.can_contain_ship(coord)]
+            possible_targets.extend(self.all_neighbours(previous_hit))
+        # Coordinates that cannot contain ships are removed.
+        possible_targets = [coord for coord in possible_targets if self.can_contain_ship(coord)]
 
         if possible_targets:
             return possible_targets
 
         # If there are still no identified target coordinates, return all coordinates that could contain a ship.
+        if njit:
+            count = viable_targets(self._board, np.array(self._blocked_rows, dtype=np.int64),
+                                   np.array(self._blocked_cols, dtype=np.int64),
+                                   self._smallest_ship_len, self._target_buffer)
+            return [(row, col) for row, col in self._target_buffer[:count].tolist()]
+
         return [(row, col) for row in range(self._n) for col in range(self._n) if self.can_contain_ship((row, col))]
 
 
@@ -304,10 +338,10 @@ def is_valid_coordinate_string(coord_string):
     row = coord_string[0]
     col = coord_string[1:]
 
-    if row.upper() not in ROWS:
+    if row.upper() not in ROW_SET:
         print('Invalid row: "{}"'.format(row))
         validity = False
-    if col not in COLS:
+    if col not in COL_SET:
         print('Invalid column "{}"'.format(col))
         validity = False
 
@@ -323,7 +357,7 @@ def get_coordinate_input():
         raw_coord = input('Enter coordinate in the form "A1": ')
 
         if is_valid_coordinate_string(raw_coord):
-            return ord(raw_coord[0].upper()) - ord('A'), int(raw_coord[1:]) - 1
+            return ord(raw_coord[0].upper()) - FIRST_ROW_ORD, int(raw_coord[1:]) - 1
 
 
 def get_direction_input():
@@ -338,20 +372,74 @@ def get_direction_input():
         print('Invalid direction "{}"'.format(direction))
 
 
-def adjacent_coordinates_in(coordinates):
+@compiled
+def viable_targets(board, blocked_rows, blocked_cols, smallest_ship_len, targets):
+    """ Finds every square of a board array that could contain a ship, see Board.can_contain_ship.
+    Args:
+        - board: The n x n numpy array of a Board object.
+        - blocked_rows, blocked_cols: Integer arrays of the bit masks of previous misses along each row and column.
+        - smallest_ship_len: Length of the smallest remaining ship.
+        - targets: An (n*n) x 2 integer array, the row and column indices of the squares are written to its first rows.
+    Returns:
+        - int: The number of squares found.
+    """
+    n = board.shape[0]
+    count = 0
+    for row in range(n):
+        for col in range(n):
+            if (board[row, col] < 2
+                    and smallest_ship_len <= max(free_line_length(blocked_rows[row], col, n),
+                                                 free_line_length(blocked_cols[col], row, n))):
+                targets[count, 0] = row
+                targets[count, 1] = col
+                count += 1
+    return count
+
+
+@compiled
+def free_line_length(blocked, position, n):
+    """ Finds the length of the run of unblocked squares through a position on a line.
+    Args:
+        - blocked: Bit mask of the line as an int, with bit i set when square i is blocked.
+        - position: Index of an unblocked square on the line.
+        - n: Length of the line.
+    Returns:
+        - int: Length of the run.
+    Examples:
+        >>> free_line_length(0b1000010, 3, 7)
+        4
+    """
+    if not blocked:
+        return n
+
+    # The run starts after the nearest blocked square below the position, and ends at the nearest one above it.
+    start = position
+    while start > 0 and not blocked >> (start - 1) & 1:
+        start -= 1
+    end = position + 1
+    while end < n and not blocked >> end & 1:
+        end += 1
+    return end - start
+
+
+def adjacent_coordinates_in(coordinates, coordinate_set=None):
     """ Given a list of coordinates, returns a list of tuples containing pairs of coordinates in the original list which
     are directly adjacent to one another.
     Args:
         - coordinates: A list of coordinates as 2-element tuples.
+        - coordinate_set: The same coordinates as a set, built from the list if not given.
     Returns:
         - list: List of 2 element-tuples containing 2-element tuples of adjacent coordinates.
     Examples:
         >>> adjacent_coordinates_in([(0, 0), (0, 1), (1, 0)])
         [((0, 1), (0, 0)), ((1, 0), (0, 0))]
     """
-    return [(coord1, coord2) for coord1 in coordinates for coord2 in coordinates
-            if (coord1[0]-coord2[0] == 1 and coord1[1]-coord2[1] == 0)
-            or (coord1[0]-coord2[0] == 0 and coord1[1]-coord2[1] == 1)]
+    # Probe the right and lower neighbours of each coordinate in a set, rather than comparing every pair.
+    if coordinate_set is None:
+        coordinate_set = set(coordinates)
+    return [(neighbour, (row, col)) for row, col in coordinates
+            for neighbour in ((row, col + 1), (row + 1, col))
+            if neighbour in coordinate_set]
 
 
 if __name__ == '__main__':
@@ -380,8 +468,12 @@ if __name__ == '__main__':
 
     # Row and column names.
     N = 10  # Boards are n x n grids
+    FIRST_ROW_ORD = ord('A')  # Character code of the first row name.
     COLS = [str(x + 1) for x in range(N)]
-    ROWS = [chr(x + ord('A')) for x in range(N)]
+    ROWS = [chr(x + FIRST_ROW_ORD) for x in range(N)]
+    # Sets of the names, for validating user input.
+    COL_SET = frozenset(COLS)
+    ROW_SET = frozenset(ROWS)
 
     # ----- Create player and computer boards -----
     player_board = Board(N)